@@ -4,12 +4,21 @@
 # arguments to be parsed from command line
 import argparse
 
-# import random
-
-from eda import eda
+from contextlib import nullcontext
+from eda import eda_batch, set_seed
+from functools import partial
+from itertools import islice
+from multiprocessing import Pool, cpu_count
 from os.path import dirname, basename, join
 from typing import Union
 
+# input/output buffer size (bytes) and number of input lines augmented and written per batch
+IO_BUFFER_SIZE = 1 << 20
+BATCH_LINES = 1024
+
+# base seed of the batches, offset by the batch index
+WORKER_SEED = 12
+
 ap = argparse.ArgumentParser()
 ap.add_argument(
     "-i",
@@ -94,6 +103,14 @@ ap.add_argument(
     help="percent of words in each sentence to be deleted (0 <= alpha_rd <= 1)",
     default=0.1,
 )
+ap.add_argument(
+    "-w",
+    "--workers",
+    required=False,
+    type=int,
+    help="number of worker processes (default: number of CPUs, 1 disables multiprocessing)",
+    default=cpu_count(),
+)
 args = ap.parse_args()
 
 # the output file
@@ -106,6 +123,49 @@ if args.alpha_sr == args.alpha_ri == args.alpha_rs == args.alpha_rd == 0:
     ap.error("At least one alpha should be greater than zero")
 
 
+def _batched(iterable, size: int):
+    """
+    Split an iterable into lists of (at most) size items.
+
+    Args:
+        iterable (iterable): iterable to be split.
+        size (int): number of items per batch.
+
+    Yields:
+        batch (list): next batch of items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _augment_lines(indexed_lines: tuple, separator: str, **eda_kwargs) -> list:
+    """
+    Augment a batch of lines of the input file. The random generator is seeded from the
+    batch index, so the output doesn't depend on which worker augments the batch.
+
+    Args:
+        indexed_lines (tuple): batch index and input lines in the format label<separator>sentence.
+        separator (str): column separator of the input file: "\t", ",", ";" etc.
+        **eda_kwargs: keyword arguments passed to eda_batch().
+
+    Returns:
+        aug_rows (list): (label, augmented sentences) pairs, one per input line.
+    """
+    batch_idx, lines = indexed_lines
+    set_seed(WORKER_SEED + batch_idx)
+
+    labels = []
+    sentences = []
+    for line in lines:
+        parts = line.rstrip("\r\n").split(separator)
+        labels.append(parts[0])
+        sentences.append(parts[1])
+
+    aug_batch = eda_batch(sentences, **eda_kwargs)
+    return list(zip(labels, aug_batch))
+
+
 # generate more data with standard augmentation
 def gen_eda(
     train_orig: str,
@@ -119,6 +179,7 @@ def gen_eda(
     num_aug: Union[int, float] = 9,
     skip_lines: int = 0,
     gen_only: bool = False,
+    workers: int = 1,
 ):
     """
     Generate more data with standard augmentation.
@@ -135,32 +196,46 @@ def gen_eda(
         num_aug (int or float, optional): number of augmented sentences per original sentence. Defaults to 9.
         skip_lines (int, optional): number of rows to skip in the input file. Defaults to 0.
         gen_only (bool, optional): if True, only return the generated sentences. Defaults to False.
+        workers (int, optional): number of worker processes, 1 runs in-process. Defaults to 1.
     """
-    with open(output_file, "w") as file_out, open(train_orig, "r") as file_source:
+    augment_lines = partial(
+        _augment_lines,
+        separator=separator,
+        language=language,
+        alpha_sr=alpha_sr,
+        alpha_ri=alpha_ri,
+        alpha_rs=alpha_rs,
+        alpha_rd=alpha_rd,
+        num_aug=num_aug,
+        gen_only=gen_only,
+    )
+
+    with open(output_file, "w", buffering=IO_BUFFER_SIZE) as file_out, open(
+        train_orig, "r", buffering=IO_BUFFER_SIZE
+    ) as file_source:
         # ? Skip header if any and just copy it to output file
         for _ in range(skip_lines):
             file_out.write(next(file_source))
 
-        # ? Augmenting sentences and writing to output file
-        for i, line in enumerate(file_source):
-            parts = line[:-1].split(separator)
-            label = parts[0]
-            sentence = parts[1]
-            aug_sentences = eda(
-                sentence,
-                language=language,
-                alpha_sr=alpha_sr,
-                alpha_ri=alpha_ri,
-                alpha_rs=alpha_rs,
-                alpha_rd=alpha_rd,
-                num_aug=num_aug,
-                gen_only=gen_only,
-            )
-            file_buf = "".join(
-                label + separator + aug_sentence + "\n"
-                for aug_sentence in aug_sentences
-            )
-            file_out.write(file_buf)
+        # ? Augmenting sentences and writing to output file in batches
+        batches = enumerate(_batched(file_source, BATCH_LINES))
+        pool = Pool(workers) if workers > 1 else nullcontext()
+        with pool:
+            # imap keeps the output in the same order as the input
+            if workers > 1:
+                aug_batches = pool.imap(augment_lines, batches)
+            else:
+                aug_batches = map(augment_lines, batches)
+
+            # stream the lines into the output buffer without joining them first
+            for aug_rows in aug_batches:
+                file_out.writelines(
+                    f"{label}{separator}{aug_sentence}\n"
+                    for label, aug_sentences in aug_rows
+                    for aug_sentence in aug_sentences
+                )
+
+        file_out.flush()
 
         # ? Summary of the task
         print(
@@ -186,6 +261,7 @@ if __name__ == "__main__":
             num_aug=args.num_aug,
             skip_lines=args.skiprows,
             gen_only=args.gen_only,
+            workers=args.workers,
         )
     except KeyboardInterrupt:
         print("\nKeyboardInterrupt")
@@ -5,6 +5,7 @@ import math
 import random
 import re
 import string
+from functools import lru_cache, partial
 
 from iso639 import Lang
 
@@ -12,14 +13,43 @@ from iso639 import Lang
 # import nltk
 # nltk.download('wordnet')
 from nltk.corpus import wordnet, stopwords
-from typing import Union
+from typing import Callable, Union
 
 __VALID_CHARS = string.ascii_lowercase + " "
 __RANDOM_SEED = 12
+__INVALID_CHARS_RE = re.compile(f"[^{re.escape(__VALID_CHARS)}]")
+__MULTISPACE_RE = re.compile(" +")
+__NUM_RANKED_SYNONYMS = 8
+# latin-1 byte table: uppercase letters to lowercase, lowercase letters and space kept,
+# everything else (including "-", "\t", "\n" and non latin-1 characters, encoded as "?")
+# to space
+__BYTE_TABLE = bytes(
+    ord(char.lower()) if char in string.ascii_letters + " " else ord(" ")
+    for char in map(chr, range(256))
+)
+
+# Dedicated generator so that augmenting doesn't reseed or consume the global random state
+__rng = random.Random(__RANDOM_SEED)
+
+# Load wordnet and stopwords at import instead of on the first augmented sentence,
+# so worker processes load them once on start (or inherit them when forked).
+try:
+    wordnet.ensure_loaded()
+    stopwords.ensure_loaded()
+    wordnet.synsets("a", lang="eng")
+except LookupError:
+    # corpora not downloaded (yet), nltk raises the usual error on first use
+    pass
+
+
+def set_seed(seed: int):
+    """
+    Seed the random generator used by the augmentation techniques.
 
-# FIXME: Inconsistency issue with the augmented sentences generated \
-#        and the number of augmented sentences when 0 < n < 1.
-random.seed(__RANDOM_SEED)
+    Args:
+        seed (int): seed value.
+    """
+    __rng.seed(seed)
 
 
 def get_only_chars(line: str) -> str:
@@ -32,28 +62,40 @@ def get_only_chars(line: str) -> str:
     Returns:
         clean_line (str): line with invalid characters removed.
     """
-    line = (
-        line.replace("’", "")
-        .replace("'", "")
-        .replace("-", " ")
-        .replace("\t", " ")
-        .replace("\n", " ")
-        .lower()
-    )
+    line = line.replace("’", "").replace("'", "")
 
-    clean_line = "".join(char if (char in __VALID_CHARS) else " " for char in line)
+    # lowercase and replace invalid characters in a single pass over the bytes
+    clean_line = (
+        line.encode("latin-1", "replace").translate(__BYTE_TABLE).decode("ascii")
+    )
 
-    clean_line = re.sub(" +", " ", clean_line).strip()  # delete extra spaces
+    clean_line = __MULTISPACE_RE.sub(" ", clean_line).strip()  # delete extra spaces
     return clean_line
 
 
+@lru_cache(maxsize=16)
+def _get_stopwords(language: str) -> frozenset:
+    """
+    Get the (cached) stopword set of a language from nltk.
+
+    Args:
+        language (str): language of the input sentence e.g. eng, deu, ind, etc.
+
+    Returns:
+        stop_words (frozenset): stopwords of the given language.
+    """
+    return frozenset(stopwords.words(Lang(language).name.lower()))
+
+
 ########################################################################
 # Synonym replacement
 # Replace n words in the sentence with synonyms from wordnet
 ########################################################################
 
 
-def synonym_replacement(words: list, n: int, language: str) -> list:
+def synonym_replacement(
+    words: list, n: int, language: str, stop_words: frozenset = None
+) -> list:
     """
     Replace n words in the sentence with synonyms from wordnet.
 
@@ -61,54 +103,137 @@ def synonym_replacement(words: list, n: int, language: str) -> list:
         words (list): list of words in the sentence.
         n (int): number of words to be replaced.
         language (str): language of the input sentence e.g. eng, deu, ind, etc.
+        stop_words (frozenset, optional): stopwords never replaced. Defaults to the
+            stopwords of the language.
 
     Returns:
         new_words (list): list of words with n words replaced with synonyms.
     """
     new_words = words.copy()
-    stop_words = stopwords.words(Lang(language).name.lower())
-    random_word_list = list(set(word for word in words if word not in stop_words))
-    random.shuffle(random_word_list)
+    if stop_words is None:
+        stop_words = _get_stopwords(language)
+    # dict.fromkeys keeps the order of the words, so a fixed seed gives the same output
+    random_word_list = list(
+        dict.fromkeys(word for word in words if word not in stop_words)
+    )
     num_replaced = 0
-
-    for random_word in random_word_list:
-        synonyms = get_synonyms(random_word, language=language)
+    had_multi = False
+
+    # positions of each word in the sentence, so replacing doesn't rescan the sentence
+    positions = {}
+    for idx, word in enumerate(words):
+        positions.setdefault(word, []).append(idx)
+
+    # draw candidate words lazily instead of shuffling the whole list upfront
+    while random_word_list and num_replaced < n:  # only replace up to n words
+        rand_idx = __rng.randrange(len(random_word_list))
+        random_word_list[rand_idx], random_word_list[-1] = (
+            random_word_list[-1],
+            random_word_list[rand_idx],
+        )
+        random_word = random_word_list.pop()
+        synonyms = _ranked_synonyms(random_word, language=language)
 
         if len(synonyms) >= 1:
-            synonym = random.choice(list(synonyms))
-            new_words = [synonym if word == random_word else word for word in new_words]
+            # prefer the synonyms closest to the original word
+            synonym = synonyms[_geometric_index(len(synonyms))]
+            for idx in positions[random_word]:
+                new_words[idx] = synonym
             num_replaced += 1
+            had_multi = had_multi or " " in synonym
 
-        if num_replaced >= n:  # only replace up to n words
-            break
-
-    # this is stupid but we need it, trust me
-    sentence = " ".join(new_words)
-    new_words = sentence.split(" ")
+    # multi-word synonyms (e.g. "ice cream") are split into separate words
+    if had_multi:
+        new_words = [part for word in new_words for part in word.split(" ")]
 
     return new_words
 
 
-def get_synonyms(word: str, language: str) -> list:
+@lru_cache(maxsize=100_000)
+def get_synonyms(word: str, language: str) -> tuple:
     """
-    Get synonyms of a word from wordnet.
+    Get synonyms of a word from wordnet. Results are cached per (word, language).
 
     Args:
         word (str): input word.
         language (str): language of the input sentence e.g. eng, deu, ind, etc.
 
     Returns:
-        synonyms (list): list of synonyms of the input word.
+        synonyms (tuple): synonyms of the input word.
+    """
+    # dict.fromkeys keeps the wordnet order, so a fixed seed gives the same output
+    synonyms = dict.fromkeys(
+        _clean_lemma(lemma.name())
+        for syn in wordnet.synsets(word, lang=language)
+        for lemma in syn.lemmas(lang=language)
+    )
+    synonyms.pop(word, None)
+    return tuple(synonyms)
+
+
+@lru_cache(maxsize=100_000)
+def _ranked_synonyms(word: str, language: str) -> tuple:
     """
-    synonyms = set()
-    for syn in wordnet.synsets(word, lang=language):
+    Get the synonyms of a word closest to its most common sense. Synonyms are ranked by
+    the path similarity between their synset and the first (most frequent) synset of the
+    word, and only the top __NUM_RANKED_SYNONYMS are kept. Results are cached per
+    (word, language).
+
+    Args:
+        word (str): input word.
+        language (str): language of the input sentence e.g. eng, deu, ind, etc.
+
+    Returns:
+        synonyms (tuple): synonyms of the input word, most similar first.
+    """
+    synsets = wordnet.synsets(word, lang=language)
+    if not synsets:
+        return ()
+
+    main_synset = synsets[0]
+    similarities = {}
+    for syn in synsets:
+        # path similarity is None between synsets of different parts of speech
+        similarity = main_synset.path_similarity(syn) or 0.0
         for lemma in syn.lemmas(lang=language):
-            synonym = lemma.name().replace("_", " ").replace("-", " ").lower()
-            synonym = "".join([char for char in synonym if char in __VALID_CHARS])
-            synonyms.add(synonym)
-    if word in synonyms:
-        synonyms.remove(word)
-    return list(synonyms)
+            synonym = _clean_lemma(lemma.name())
+            if synonym != word:
+                similarities[synonym] = max(similarities.get(synonym, 0.0), similarity)
+
+    # sorted() is stable, so ties keep the wordnet order
+    ranked = sorted(similarities, key=similarities.get, reverse=True)
+    return tuple(ranked[:__NUM_RANKED_SYNONYMS])
+
+
+def _clean_lemma(name: str) -> str:
+    """
+    Turn a wordnet lemma name into a plain lowercase synonym.
+
+    Args:
+        name (str): lemma name e.g. "ice_cream".
+
+    Returns:
+        synonym (str): synonym with invalid characters removed e.g. "ice cream".
+    """
+    synonym = name.replace("_", " ").replace("-", " ").lower()
+    return __INVALID_CHARS_RE.sub("", synonym)
+
+
+def _geometric_index(size: int, probability: float = 0.5) -> int:
+    """
+    Draw an index from a geometric distribution truncated to [0, size).
+
+    Args:
+        size (int): number of available indices.
+        probability (float): probability of stopping at each index (default: 0.5).
+
+    Returns:
+        idx (int): drawn index, lower indices being more likely.
+    """
+    idx = 0
+    while idx < size - 1 and __rng.random() >= probability:
+        idx += 1
+    return idx
 
 
 ########################################################################
@@ -133,11 +258,13 @@ def random_deletion(words: list, probability: float) -> list:
         return words
 
     # randomly delete words with probability p
-    new_words = [word for word in words if random.uniform(0, 1) > probability]
+    # (random() draws the same values as uniform(0, 1) without its overhead)
+    rand = __rng.random
+    new_words = [word for word in words if rand() > probability]
 
     # if you end up deleting all words, just return a random word
     if len(new_words) == 0:
-        rand_int = random.randint(0, len(words) - 1)
+        rand_int = __rng.randint(0, len(words) - 1)
         return [words[rand_int]]
 
     return new_words
@@ -161,6 +288,8 @@ def random_swap(words: list, n: int) -> list:
         new_words (list): list of words with n pairs of words swapped.
     """
     new_words = words.copy()
+    # positions are drawn per swap: two randrange calls are cheaper than pre-drawing
+    # all pairs with random.sample
     for _ in range(n):
         new_words = swap_word(new_words)
     return new_words
@@ -176,14 +305,15 @@ def swap_word(new_words: list) -> list:
     Returns:
         new_words (list): list of words with two words swapped.
     """
-    random_idx_1 = random.randint(0, len(new_words) - 1)
-    random_idx_2 = random_idx_1
-    counter = 0
-    while random_idx_2 == random_idx_1:
-        random_idx_2 = random.randint(0, len(new_words) - 1)
-        counter += 1
-        if counter > 3:
-            return new_words
+    length = len(new_words)
+    if length < 2:
+        return new_words
+
+    # draw the second position among the other length - 1 ones, so that both are
+    # distinct without redrawing on collisions
+    random_idx_1 = __rng.randrange(length)
+    random_idx_2 = __rng.randrange(length - 1)
+    random_idx_2 += random_idx_2 >= random_idx_1
     new_words[random_idx_1], new_words[random_idx_2] = (
         new_words[random_idx_2],
         new_words[random_idx_1],
@@ -210,36 +340,49 @@ def random_insertion(words: list, n: int, language: str) -> list:
         new_words (list): list of words with n words inserted.
     """
     new_words = words.copy()
-    for _ in range(n):
-        try:
-            add_word(new_words, language=language)
-        except ValueError as e:
-            print(f"{new_words=}")
-            raise e
+
+    # look up once which words have synonyms instead of retrying random words
+    candidates = [word for word in words if get_synonyms(word, language=language)]
+    if not candidates:
+        return new_words
+
+    # every insertion succeeds, so the k-th one picks among len(words) + k positions
+    insert_indices = [__rng.randrange(len(words) + k) for k in range(n)]
+    for random_idx in insert_indices:
+        add_word(
+            new_words, language=language, candidates=candidates, random_idx=random_idx
+        )
     return new_words
 
 
-def add_word(new_words: list, language: str):
+def add_word(
+    new_words: list, language: str, candidates: list = None, random_idx: int = None
+):
     """
     Randomly insert a word into the sentence.
 
     Args:
         new_words (list): list of words in the sentence.
         language (str): language of the input sentence e.g. eng, deu, ind, etc.
+        candidates (list, optional): words having synonyms to pick from. Defaults to the
+            words of new_words having synonyms.
+        random_idx (int, optional): position to insert the synonym at. Defaults to a
+            random position.
 
     Returns:
         new_words (list): list of words with a word inserted.
     """
-    synonyms = []
-    counter = 0
-    while len(synonyms) < 1:
-        random_word = new_words[random.randint(0, len(new_words) - 1)]
-        synonyms = get_synonyms(random_word, language=language)
-        counter += 1
-        if counter >= 10:
+    if candidates is None:
+        candidates = [
+            word for word in new_words if get_synonyms(word, language=language)
+        ]
+        if not candidates:
             return
-    random_synonym = synonyms[0]
-    random_idx = random.randint(0, len(new_words) - 1)
+
+    random_word = __rng.choice(candidates)
+    random_synonym = __rng.choice(get_synonyms(random_word, language=language))
+    if random_idx is None:
+        random_idx = __rng.randrange(len(new_words))
     new_words.insert(random_idx, random_synonym)
 
 
@@ -272,16 +415,143 @@ def get_num_per_technique(num_aug: Union[int, float], flags: list) -> list:
     # If there's a remainder, add 1 to a random technique
     # for _ in range(math.ceil(num_aug % 4)):
     #     num_new_per_technique[random.randint(0, 4 - 1)] += 1
+    # Only enabled techniques are drawn, so there's no need to redraw disabled ones
     remainder = math.ceil(num_aug % num_methods)
-    while remainder > 0:
-        position = random.randint(0, num_methods - 1)
-        if flags[position]:
+    enabled = [pos for pos in range(num_methods) if flags[pos]]
+    if enabled:
+        for position in __rng.choices(enabled, k=remainder):
             num_new_per_technique[position] += 1
-            remainder -= 1
 
     return num_new_per_technique
 
 
+def make_eda(
+    language: str = "eng",
+    num_aug: Union[int, float] = 9,
+    alpha_sr: float = 0.1,
+    alpha_ri: float = 0.1,
+    alpha_rs: float = 0.1,
+    alpha_rd: float = 0.1,
+    randomize: bool = False,
+    gen_only: bool = False,
+) -> Callable[[str], list]:
+    """
+    Build an EDA function specialized for one configuration. Everything that doesn't
+    depend on the sentence (enabled techniques, their arguments, etc.) is resolved once
+    here instead of on every call.
+
+    Args:
+        language (str): language of the input sentences e.g. eng, deu, ind, etc. (default: eng).
+        num_aug (int or float): number of augmented sentences to generate per original sentence (default: 9).
+        alpha_sr (float): percent of words in each sentence to be replaced by synonyms (0 <= alpha_sr <= 1).
+        alpha_ri (float): percent of words in each sentence to be inserted (0 <= alpha_sr <= 1).
+        alpha_rs (float): percent of words in each sentence to be swapped (0 <= alpha_sr <= 1).
+        alpha_rd (float): percent of words in each sentence to be deleted (0 <= alpha_sr <= 1).
+        randomize (bool): whether to shuffle the augmented sentences (default: False).
+        gen_only (bool): whether to return only the augmented sentences (default: False).
+
+    Returns:
+        augment (callable): function taking a sentence and returning the list of augmented sentences.
+
+    Raises:
+        ValueError: if no alpha is greater than zero.
+    """
+    if not (alpha_sr > 0 or alpha_ri > 0 or alpha_rs > 0 or alpha_rd > 0):
+        raise ValueError("At least one alpha should be greater than zero")
+
+    flags = [alpha_sr, alpha_ri, alpha_rs, alpha_rd]
+    max_aug = int(num_aug)
+    stop_words = _get_stopwords(language) if alpha_sr > 0 else None
+
+    def num_words_to_change(alpha: float) -> Callable[[int], int]:
+        return lambda num_words: max(1, int(alpha * num_words))
+
+    # (position in num_new_per_technique, technique, argument of the technique given the
+    # number of words) of the enabled techniques
+    techniques = [
+        (position, technique, technique_arg)
+        for position, (technique, alpha, technique_arg) in enumerate(
+            [
+                (
+                    partial(
+                        synonym_replacement, language=language, stop_words=stop_words
+                    ),
+                    alpha_sr,
+                    num_words_to_change(alpha_sr),
+                ),
+                (
+                    partial(random_insertion, language=language),
+                    alpha_ri,
+                    num_words_to_change(alpha_ri),
+                ),
+                (random_swap, alpha_rs, num_words_to_change(alpha_rs)),
+                # deletion takes the probability itself
+                (random_deletion, alpha_rd, lambda num_words: alpha_rd),
+            ]
+        )
+        if alpha > 0
+    ]
+
+    def augment(sentence: str) -> list:
+        # REVIEW: Consider cleaning the sentence for sr and ri only to preserve the originality.
+        clean_sentence = get_only_chars(sentence)
+
+        # split() drops empty strings itself, no need for a second pass over the words
+        words = clean_sentence.split()
+        num_words = len(words)
+
+        # ? If cleaned sentence is empty, simply return the original sentence
+        if num_words == 0:
+            return []
+
+        num_new_per_technique = get_num_per_technique(num_aug, flags=flags)
+        augmented_sentences = []
+
+        for position, technique, technique_arg in techniques:
+            arg = technique_arg(num_words)
+            for _ in range(num_new_per_technique[position]):
+                a_words = technique(words, arg)
+                augmented_sentences.append(" ".join(a_words))
+
+        # Clean up augmented sentences. They are built from the cleaned words and filtered
+        # synonyms, so only the extra spaces (e.g. from empty synonyms) need to be removed.
+        augmented_sentences = [
+            __MULTISPACE_RE.sub(" ", sentence).strip()
+            for sentence in augmented_sentences
+        ]
+
+        if randomize:
+            __rng.shuffle(augmented_sentences)
+
+        # trim so that we have the desired number of augmented sentences
+        # REVIEW: Possibly fixed with get_num_per_technique(). Consider removing the if block.
+        if num_aug >= 1 and len(augmented_sentences) > max_aug:
+            print(
+                f"cutting off {len(augmented_sentences) - max_aug} augmented sentences "
+                f"(from {len(augmented_sentences)}) // {num_new_per_technique}"
+            )
+            augmented_sentences = augmented_sentences[:max_aug]
+
+        # FIXME: Inconsistency issue with the augmented sentences generated \
+        #        and the number of augmented sentences when 0 < n < 1.
+        elif num_aug > 0:  # 0 < num_aug < 1
+            keep_prob = num_aug / len(augmented_sentences)
+            augmented_sentences = [
+                aug_sentence
+                for aug_sentence in augmented_sentences
+                if __rng.uniform(0, 1) < keep_prob
+            ]
+
+        # append the original sentence
+        # augmented_sentences.append(sentence)
+        if gen_only:
+            return augmented_sentences
+        else:
+            return [sentence] + augmented_sentences
+
+    return augment
+
+
 def eda(
     sentence: str,
     language: str = "eng",
@@ -294,7 +564,8 @@ def eda(
     gen_only: bool = False,
 ) -> list:
     """
-    Perform EDA on sentence.
+    Perform EDA on sentence. Use make_eda() to augment many sentences with the same
+    configuration.
 
     Args:
         sentence (str): input sentence to be augmented.
@@ -310,76 +581,56 @@ def eda(
     Returns:
         augmented_sentences (list): list of augmented sentences.
     """
+    augment = make_eda(
+        language=language,
+        num_aug=num_aug,
+        alpha_sr=alpha_sr,
+        alpha_ri=alpha_ri,
+        alpha_rs=alpha_rs,
+        alpha_rd=alpha_rd,
+        randomize=randomize,
+        gen_only=gen_only,
+    )
+    return augment(sentence)
 
-    # REVIEW: Consider cleaning the sentence for sr and ri only to preserve the originality.
-    clean_sentence = get_only_chars(sentence)
 
-    words = clean_sentence.split(" ")
-    words = [word for word in words if word != ""]
-    num_words = len(words)
+def eda_batch(
+    sentences: list,
+    language: str = "eng",
+    num_aug: Union[int, float] = 9,
+    alpha_sr: float = 0.1,
+    alpha_ri: float = 0.1,
+    alpha_rs: float = 0.1,
+    alpha_rd: float = 0.1,
+    randomize: bool = False,
+    gen_only: bool = False,
+) -> list:
+    """
+    Perform EDA on a batch of sentences. The configuration (including the stopwords of
+    the language) is resolved once for the whole batch by make_eda().
 
-    # ? If cleaned sentence is empty, simply return the original sentence
-    if num_words == 0:
-        return []
+    Args:
+        sentences (list): input sentences to be augmented.
+        language (str): language of the input sentences e.g. eng, deu, ind, etc. (default: eng).
+        num_aug (int or float): number of augmented sentences to generate per original sentence (default: 9).
+        alpha_sr (float): percent of words in each sentence to be replaced by synonyms (0 <= alpha_sr <= 1).
+        alpha_ri (float): percent of words in each sentence to be inserted (0 <= alpha_sr <= 1).
+        alpha_rs (float): percent of words in each sentence to be swapped (0 <= alpha_sr <= 1).
+        alpha_rd (float): percent of words in each sentence to be deleted (0 <= alpha_sr <= 1).
+        randomize (bool): whether to shuffle the augmented sentences (default: False).
+        gen_only (bool): whether to return only the augmented sentences (default: False).
 
-    num_new_per_technique = get_num_per_technique(
-        num_aug, flags=[alpha_sr, alpha_ri, alpha_rs, alpha_rd]
+    Returns:
+        augmented_batch (list): list of augmented sentences for each input sentence.
+    """
+    augment = make_eda(
+        language=language,
+        num_aug=num_aug,
+        alpha_sr=alpha_sr,
+        alpha_ri=alpha_ri,
+        alpha_rs=alpha_rs,
+        alpha_rd=alpha_rd,
+        randomize=randomize,
+        gen_only=gen_only,
     )
-    augmented_sentences = []
-
-    # sr / synonym replacement
-    if alpha_sr > 0:
-        num_sr = max(1, int(alpha_sr * num_words))
-        for _ in range(num_new_per_technique[0]):
-            a_words = synonym_replacement(words, num_sr, language=language)
-            augmented_sentences.append(" ".join(a_words))
-
-    # ri / insertion
-    if alpha_ri > 0:
-        num_ri = max(1, int(alpha_ri * num_words))
-        for _ in range(num_new_per_technique[1]):
-            a_words = random_insertion(words, num_ri, language=language)
-            augmented_sentences.append(" ".join(a_words))
-
-    # rs / swap
-    if alpha_rs > 0:
-        num_rs = max(1, int(alpha_rs * num_words))
-        for _ in range(num_new_per_technique[2]):
-            a_words = random_swap(words, num_rs)
-            augmented_sentences.append(" ".join(a_words))
-
-    # rd / deletion
-    if alpha_rd > 0:
-        for _ in range(num_new_per_technique[3]):
-            a_words = random_deletion(words, alpha_rd)
-            augmented_sentences.append(" ".join(a_words))
-
-    # Clean up augmented sentences
-    augmented_sentences = [get_only_chars(sentence) for sentence in augmented_sentences]
-
-    if randomize:
-        random.shuffle(augmented_sentences)
-
-    # trim so that we have the desired number of augmented sentences
-    # REVIEW: Possibly fixed with get_num_per_technique(). Consider removing the if block.
-    if num_aug >= 1 and len(augmented_sentences) > int(num_aug):
-        print(
-            f"cutting off {len(augmented_sentences) - int(num_aug)} augmented sentences "
-            f"(from {len(augmented_sentences)}) // {num_new_per_technique}"
-        )
-        augmented_sentences = augmented_sentences[: int(num_aug)]
-
-    elif num_aug > 0:  # 0 < num_aug < 1
-        keep_prob = num_aug / len(augmented_sentences)
-        augmented_sentences = [
-            aug_sentence
-            for aug_sentence in augmented_sentences
-            if random.uniform(0, 1) < keep_prob
-        ]
-
-    # append the original sentence
-    # augmented_sentences.append(sentence)
-    if gen_only:
-        return augmented_sentences
-    else:
-        return [sentence] + augmented_sentences
+    return [augment(sentence) for sentence in sentences]